@@ -0,0 +1,102 @@
+import os
+import sys
+import logging
+from typing import Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+def approx_size(value: Optional[str]) -> int:
+    """Approximate bytes held by a string, O(1) regardless of its length."""
+    return sys.getsizeof(value) if value else 0
+
+
+class RequestBudget:
+    """Per-request memory budget for scraped sources and prompts."""
+
+    def __init__(self, controller: "AdmissionController", limit: int):
+        self.controller = controller
+        self.limit = limit
+        self.held = 0
+
+    def charge(self, nbytes: int) -> bool:
+        if self.held + nbytes > self.limit:
+            return False
+        self.held += nbytes
+        self.controller.held_bytes += nbytes
+        return True
+
+    def remaining(self) -> int:
+        return self.limit - self.held
+
+    def release(self, nbytes: int) -> None:
+        nbytes = min(nbytes, self.held)
+        self.held -= nbytes
+        self.controller.held_bytes -= nbytes
+
+
+class AdmissionController:
+    """
+    Global limit on in-flight generations and the memory they hold.
+
+    Every admitted request reserves `request_budget_bytes` against
+    `max_total_bytes`, so a burst of long-form requests is turned away with a
+    fast 503 instead of pushing the worker into OOM.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_total_bytes: int,
+        request_budget_bytes: int,
+        retry_after: int,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_total_bytes = max_total_bytes
+        self.request_budget_bytes = request_budget_bytes
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.held_bytes = 0
+        self.rejected = 0
+
+    def acquire(self) -> RequestBudget:
+        reserved = self.in_flight * self.request_budget_bytes
+        if (
+            self.in_flight >= self.max_in_flight
+            or reserved + self.request_budget_bytes > self.max_total_bytes
+        ):
+            self.rejected += 1
+            logger.warning(
+                f"Rejecting generation: {self.in_flight} in flight, {self.held_bytes} bytes held"
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="Server is at capacity, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        self.in_flight += 1
+        return RequestBudget(self, self.request_budget_bytes)
+
+    def release(self, budget: RequestBudget) -> None:
+        budget.release(budget.held)
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "held_bytes": self.held_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "request_budget_bytes": self.request_budget_bytes,
+            "rejected": self.rejected,
+        }
+
+
+admission_controller = AdmissionController(
+    max_in_flight=int(os.getenv("WRITEAI_MAX_IN_FLIGHT", "8")),
+    max_total_bytes=int(os.getenv("WRITEAI_MAX_TOTAL_BYTES", str(512 * 1024 * 1024))),
+    request_budget_bytes=int(os.getenv("WRITEAI_REQUEST_BUDGET_BYTES", str(32 * 1024 * 1024))),
+    retry_after=int(os.getenv("WRITEAI_RETRY_AFTER", "5")),
+)
@@ -1,17 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from pydantic import BaseModel
 import uvicorn
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
 import signal
+import asyncio
 from phi.agent import Agent
 from phi.model.groq import Groq
 from phi.model.google import Gemini
 from phi.tools.duckduckgo import DuckDuckGo
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+from profiling import start_profile, finish_profile, stage, debug_router, PROFILE_ID_HEADER
+from search_backends import build_search, merge_results
+from platform_validation import repair_content, PlatformLimits
+from disconnect import run_blocking
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.include_router(debug_router)
 
 origins = [
     "http://localhost:3000",
@@ -63,6 +71,12 @@ class Platform(str, Enum):
     PODCAST_SCRIPT = "podcast_script"
     VIDEO_SCRIPT = "video_script"
 
+class GenerationMode(str, Enum):
+    # Leader agent delegating to researcher and writer agents
+    TEAM = "team"
+    # Deterministic parallel search followed by a single writer call
+    DIRECT = "direct"
+
 class GenerationRequest(BaseModel):
     provider: Provider
     model_name: str
@@ -70,18 +84,43 @@ class GenerationRequest(BaseModel):
     platform: Platform
     input_text: str
     serper_api_key: Optional[str] = None
+    mode: GenerationMode = GenerationMode.TEAM
+
+class UsageReport(BaseModel):
+    mode: GenerationMode
+    llm_round_trips: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
 
 class GenerationResponse(BaseModel):
     content: str
     summary: Optional[str] = None
     status: str
+    usage: Optional[UsageReport] = None
+
+# Running totals per platform and mode, to pick the cheapest mode per platform
+usage_totals: Dict[str, Dict[str, Dict[str, int]]] = {}
+
+# Writer persona, shared by team and direct mode so both write the same way
+WRITER_DESCRIPTION = 'you are a senior NYT write that have a passion to write content for the platform. you are amazing articles for different platforms that are engaging and have a high engagement rate with a great hook and content either its informative tutorials or reviews or coding you are always great writer. you have to write eo friendly content that can rank. Experienced content writer with platform expertise, dont ask any questionsa to the user and just write the content'
+
+# Hard limits the prompts below ask for, checked and repaired after generation.
+# These prompts set no thread length or Reels word count, so those are not checked.
+PLATFORM_LIMITS = PlatformLimits(
+    tweet_max_chars=280,
+    instagram_max_chars=2200,
+    instagram_max_hashtags=30,
+    youtube_title_max_chars=60,
+)
 
 def get_platform_instructions(platform: Platform) -> str:
+    limits = PLATFORM_LIMITS
     instructions = {
         # Social Media Platforms
-        Platform.INSTAGRAM: """
-        1. Create engaging Instagram post content (2200 characters max)
-        2. Include relevant hashtags (max 30)
+        Platform.INSTAGRAM: f"""
+        1. Create engaging Instagram post content ({limits.instagram_max_chars} characters max)
+        2. Include relevant hashtags (max {limits.instagram_max_hashtags})
         3. Write compelling captions that drive engagement
         4. Include call-to-action
         5. Structure: Hook → Value → Call-to-action
@@ -93,9 +132,9 @@ def get_platform_instructions(platform: Platform) -> str:
         4. Focus on trending formats and patterns
         5. Include music/sound recommendations
         """,
-        Platform.YOUTUBE: """
+        Platform.YOUTUBE: f"""
         1. Create detailed video script with timestamps
-        2. Write compelling title (60 characters max)
+        2. Write compelling title ({limits.youtube_title_max_chars} characters max)
         3. Create description with timestamps and links
         4. Include relevant tags and keywords
         5. Add end screen suggestions
@@ -107,9 +146,9 @@ def get_platform_instructions(platform: Platform) -> str:
         4. Clear call-to-action
         5. Trending audio suggestions
         """,
-        Platform.TWITTER: """
+        Platform.TWITTER: f"""
         1. Create engaging tweet thread
-        2. 280 characters per tweet
+        2. {limits.tweet_max_chars} characters per tweet
         3. Include relevant hashtags
         4. Create thread hooks
         5. End with call-to-action
@@ -193,8 +232,114 @@ def get_platform_instructions(platform: Platform) -> str:
     }
     return instructions.get(platform, "Create general content optimized for the platform")
 
+def metric_value(metrics: dict, *names: str) -> int:
+    for name in names:
+        value = metrics.get(name)
+        if value:
+            return int(sum(value) if isinstance(value, list) else value)
+    return 0
+
+def collect_usage(mode: GenerationMode, model) -> UsageReport:
+    """
+    Count model round trips and tokens at the model layer.
+    Every agent of a request (team leader, each delegation to a member) and
+    every repair call goes through the request's one model instance, whose
+    metrics accumulate across all of its calls.
+    """
+    metrics = model.metrics or {}
+    round_trips = len(metrics.get("response_times", []))
+    input_tokens = metric_value(metrics, "input_tokens", "prompt_tokens")
+    output_tokens = metric_value(metrics, "output_tokens", "completion_tokens")
+    total_tokens = metric_value(metrics, "total_tokens")
+    return UsageReport(
+        mode=mode,
+        llm_round_trips=round_trips,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=total_tokens or input_tokens + output_tokens,
+    )
+
+def record_usage(platform: Platform, usage: UsageReport) -> None:
+    totals = usage_totals.setdefault(platform.value, {}).setdefault(
+        usage.mode.value, {"requests": 0, "llm_round_trips": 0, "total_tokens": 0}
+    )
+    totals["requests"] += 1
+    totals["llm_round_trips"] += usage.llm_round_trips
+    totals["total_tokens"] += usage.total_tokens
+
+def research_queries(topic: str) -> List[str]:
+    return [topic, f"{topic} latest news", f"{topic} statistics and data"]
+
+async def prefetch_research(topic: str, serper_api_key: Optional[str] = None, max_results: int = 5) -> str:
+    """Run all research searches in parallel and format them for the prompt."""
+    search = build_search(serper_api_key)
+    responses = await asyncio.gather(
+        *(search.search(query, max_results) for query in research_queries(topic)),
+        return_exceptions=True,
+    )
+    result_sets = []
+    for response in responses:
+        if isinstance(response, Exception):
+            logger.error(f"Research search failed: {str(response)}")
+            continue
+        result_sets.append(response)
+    return "\n".join(
+        f"- {result.title or 'Untitled'} ({result.url}): {result.snippet}"
+        for result in merge_results(result_sets)
+    )
+
+async def repair_output(platform: Platform, content: Optional[str], model) -> Optional[str]:
+    """Check the output against PLATFORM_LIMITS and repair only the offending parts."""
+    if not content:
+        return content
+    with stage("platform_repair"):
+        repaired = await run_blocking(repair_content, platform.value, content, model, PLATFORM_LIMITS)
+    if repaired['repair_calls']:
+        logger.info(f"Repaired {platform.value} output with {repaired['repair_calls']} model calls")
+    return repaired['content']
+
+async def generate_direct(request: GenerationRequest, model) -> GenerationResponse:
+    with stage("research_prefetch"):
+        research = await prefetch_research(request.input_text, request.serper_api_key)
+
+    writer = Agent(
+        description=WRITER_DESCRIPTION,
+        instructions=f"""
+        Generate content for {request.platform.value} with the following requirements:
+        {get_platform_instructions(request.platform)}
+        Topic: {request.input_text}
+        Base the content on the research below and mention sources and references.
+        dont talk like and ai agent and your name is writeAI.
+
+        Research:
+        {research or "No search results were found, rely on your own knowledge."}
+        """,
+        model=model,
+        markdown=True
+    )
+    with stage("direct_writer_run"):
+        response = writer.run(request.input_text)
+    content = await repair_output(request.platform, response.content, model)
+
+    usage = collect_usage(GenerationMode.DIRECT, model)
+    record_usage(request.platform, usage)
+    return GenerationResponse(
+        content=content,
+        summary=response.summary if hasattr(response, 'summary') else None,
+        status="success",
+        usage=usage,
+    )
+
 @app.post("/api/generate", response_model=GenerationResponse)
-async def generate_content(request: GenerationRequest):
+async def generate_content(
+    request: GenerationRequest,
+    http_response: Response,
+    x_writeai_profile: Optional[str] = Header(None),
+):
+    # Opt-in sampling profile, enabled by admin header or WRITEAI_PROFILE_SAMPLE_RATE
+    profile = start_profile("api.generate_content", x_writeai_profile)
+    if profile:
+        http_response.headers[PROFILE_ID_HEADER] = profile.id
     try:
         # Initialize the model based on provider
         if request.provider == Provider.GEMINI:
@@ -210,6 +355,10 @@ async def generate_content(request: GenerationRequest):
             )
             print("groq api mil gaya malik")
 
+        # Single writer call with research prefetched outside the model
+        if request.mode == GenerationMode.DIRECT:
+            return await generate_direct(request, model)
+
         # Initialize agents
         researcher = Agent(
             role='Content Researcher',
@@ -225,7 +374,7 @@ async def generate_content(request: GenerationRequest):
         writer = Agent(
             role='Content Writer',
             goal='Generate platform-specific content based on research',
-            description='you are a senior NYT write that have a passion to write content for the platform. you are amazing articles for different platforms that are engaging and have a high engagement rate with a great hook and content either its informative tutorials or reviews or coding you are always great writer. you have to write eo friendly content that can rank. Experienced content writer with platform expertise, dont ask any questionsa to the user and just write the content',
+            description=WRITER_DESCRIPTION,
             instructions=f"""
             Generate content for {request.platform.value} with the following requirements:
             {get_platform_instructions(request.platform)}
@@ -249,19 +398,31 @@ async def generate_content(request: GenerationRequest):
         )
 
         # Generate content
-        response = multi_agent.run(request.input_text)
+        with stage("multi_agent_run"):
+            response = multi_agent.run(request.input_text)
         print("content generate kr raha hu malik")
+        content = await repair_output(request.platform, response.content, model)
+
+        usage = collect_usage(GenerationMode.TEAM, model)
+        record_usage(request.platform, usage)
         
         return GenerationResponse(
-            content=response.content,
+            content=content,
             summary=response.summary if hasattr(response, 'summary') else None,
             status="success",
+            usage=usage,
         )
         
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await finish_profile(profile)
+
 
+@app.get("/api/usage")
+async def get_usage():
+    return {"usage": usage_totals}
 
 @app.get("/api/providers")
 async def get_providers():
@@ -0,0 +1,154 @@
+"""
+Benchmark the multi-worker server (WRITEAI_WORKERS) across cores.
+
+Seeds the shared SQLite cache with one generation, then starts `python new.py`
+with 1, 2, 4 .. N uvicorn workers and drives cached `/api/generate` requests
+("use_cache": true) over HTTP, so every request is served by a worker from the
+shared cache without any provider call:
+    python bench_scaling.py --max-workers 8 --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import aiohttp
+
+from shared_cache import SharedCache
+
+GENERATION_REQUEST = {
+    "provider": "gemini",
+    "model_name": "gemini-1.5-flash",
+    "api_key": "bench-key",
+    "platform": "linkedin",
+    "input_text": "How shared caches scale across worker processes",
+    "use_cache": True,
+}
+GENERATION_RESPONSE = {
+    "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 60,
+    "summary": "Lorem ipsum dolor sit amet.",
+    "status": "success",
+}
+
+
+def seed_generation(path: str) -> None:
+    cache = SharedCache("generation", ttl=3600, path=path)
+    key = cache.make_key(
+        GENERATION_REQUEST["provider"], GENERATION_REQUEST["model_name"], GENERATION_REQUEST["api_key"],
+        GENERATION_REQUEST["platform"], GENERATION_REQUEST["input_text"],
+    )
+    cache.set(key, GENERATION_RESPONSE)
+
+
+def start_server(workers: int, port: int, cache_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WRITEAI_WORKERS": str(workers),
+        "WRITEAI_PORT": str(port),
+        "WRITEAI_CACHE_PATH": cache_path,
+    }
+    return subprocess.Popen(
+        [sys.executable, "new.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_ready(server: subprocess.Popen, base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                async with session.get(f"{base_url}/api/providers") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+async def drive(base_url: str, requests: int, concurrency: int) -> dict:
+    statuses = {}
+    remaining = requests
+
+    async def client(session: aiohttp.ClientSession) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            async with session.post(f"{base_url}/api/generate", json=GENERATION_REQUEST) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    return statuses
+
+
+def client_worker(args) -> dict:
+    base_url, requests, concurrency = args
+    return asyncio.run(drive(base_url, requests, concurrency))
+
+
+def measure(base_url: str, requests: int, concurrency: int, clients: int) -> dict:
+    # Several client processes so the load generator is not the bottleneck
+    with Pool(clients) as pool:
+        start = time.perf_counter()
+        results = pool.map(client_worker, [(base_url, requests // clients, concurrency) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+    statuses = {}
+    for result in results:
+        for status, count in result.items():
+            statuses[status] = statuses.get(status, 0) + count
+    total = sum(statuses.values())
+    return {
+        "requests_per_second": round(total / elapsed),
+        "ok_ratio": round(statuses.get(200, 0) / total, 3) if total else 0,
+        "statuses": statuses,
+    }
+
+
+def run(max_workers: int, requests: int, concurrency: int, clients: int, port: int) -> dict:
+    report = {"scaling": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "cache.sqlite3")
+        seed_generation(cache_path)
+        base_url = f"http://127.0.0.1:{port}"
+
+        workers = 1
+        while workers <= max_workers:
+            server = start_server(workers, port, cache_path)
+            try:
+                asyncio.run(wait_until_ready(server, base_url))
+                # Warm every worker's connection to the cache before timing
+                measure(base_url, workers * 50, concurrency, 1)
+                result = measure(base_url, requests, concurrency, clients)
+            finally:
+                server.terminate()
+                server.wait()
+            report["scaling"].append({"workers": workers, **result})
+            workers *= 2
+
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64, help="open connections per client process")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    run(args.max_workers, args.requests, args.concurrency, args.clients, args.port)
@@ -0,0 +1,80 @@
+"""
+Check and time multi-engine search against fixture backends, offline.
+
+A fast engine and a slow engine answer the same query with overlapping
+results. Checks that merge de-duplicates both engines' results when they
+answer in time, that the deadline drops the slow engine without waiting for
+it (and marks the answer incomplete, so it is not cached), and that
+first_good returns the fast engine's answer straight away:
+    python bench_search.py --delay 0.5 --deadline 0.2
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from search_backends import FixtureBackend, MultiEngineSearch, normalize_url
+
+QUERY = "solar panel efficiency"
+
+FAST_RESULTS = [
+    {"url": "https://example.com/a", "title": "A"},
+    {"url": "https://example.com/b/", "title": "B"},
+]
+SLOW_RESULTS = [
+    {"url": "https://EXAMPLE.com/b", "title": "B again"},
+    {"url": "https://example.com/c", "title": "C"},
+]
+
+
+def engines(delay: float):
+    fast = FixtureBackend({QUERY: FAST_RESULTS})
+    fast.name = "fast"
+    slow = FixtureBackend({QUERY: SLOW_RESULTS}, delay=delay)
+    slow.name = "slow"
+    return [fast, slow]
+
+
+async def timed_search(search: MultiEngineSearch) -> dict:
+    start = time.perf_counter()
+    results, complete = await search.search_with_status(QUERY, max_results=5)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "complete": complete,
+        "signature": search.signature,
+        "urls": [normalize_url(r.url) for r in results],
+        "engines": sorted({r.engine for r in results}),
+    }
+
+
+async def run(delay: float, deadline: float) -> dict:
+    merged = await timed_search(MultiEngineSearch(engines(delay), deadline=delay * 4))
+    cut_off = await timed_search(MultiEngineSearch(engines(delay), deadline=deadline))
+    first_good = await timed_search(MultiEngineSearch(engines(delay), deadline=delay * 4, first_good=True))
+
+    expected = ["https://example.com/a", "https://example.com/b", "https://example.com/c"]
+    report = {
+        "merge": merged,
+        "deadline": cut_off,
+        "first_good": first_good,
+        "checks": {
+            "merge_deduplicates_all_engines": merged["urls"] == expected and merged["complete"],
+            "deadline_skips_slow_engine": (
+                cut_off["engines"] == ["fast"] and cut_off["seconds"] < delay and not cut_off["complete"]
+            ),
+            "first_good_returns_fast_engine": first_good["engines"] == ["fast"] and first_good["seconds"] < delay,
+            "strategy_in_cache_signature": merged["signature"] != first_good["signature"],
+        },
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds the slow engine takes to answer")
+    parser.add_argument("--deadline", type=float, default=0.2, help="deadline for the cut-off check")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.delay, args.deadline))
+    if not all(report["checks"].values()):
+        raise SystemExit(1)
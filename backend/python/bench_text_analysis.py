@@ -0,0 +1,98 @@
+"""
+Benchmark the batch keyword/summary extractor against newspaper's article.nlp().
+
+Record a corpus once (raw HTML is stored so runs are repeatable offline):
+    python bench_text_analysis.py --record https://example.com/a https://example.com/b
+
+Then run the comparison:
+    python bench_text_analysis.py
+"""
+import argparse
+import json
+import time
+from typing import List, Dict, Any
+
+import requests
+from newspaper import Article
+
+from text_analysis import extract_keywords_and_summaries, split_sentences
+
+DEFAULT_CORPUS = "bench_corpus.json"
+
+
+def record_corpus(urls: List[str], path: str) -> None:
+    corpus = []
+    for url in urls:
+        try:
+            response = requests.get(url, timeout=10)
+            corpus.append({"url": url, "html": response.text})
+            print(f"recorded {url} ({len(response.text)} bytes)")
+        except Exception as e:
+            print(f"skipped {url}: {str(e)}")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f)
+
+
+def load_articles(path: str) -> List[Article]:
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+    articles = []
+    for record in corpus:
+        article = Article(record["url"])
+        article.download(input_html=record["html"])
+        article.parse()
+        if article.text:
+            articles.append(article)
+    return articles
+
+
+def overlap(a: List[str], b: List[str]) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def run(path: str, repeat: int) -> Dict[str, Any]:
+    articles = load_articles(path)
+    documents = [{"title": a.title, "text": a.text} for a in articles]
+    print(f"{len(articles)} documents, {sum(len(d['text']) for d in documents)} characters")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for article in articles:
+            article.nlp()
+    newspaper_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extracted = extract_keywords_and_summaries(documents)
+    batch_time = (time.perf_counter() - start) / repeat
+
+    keyword_overlap = [overlap(a.keywords, e["keywords"]) for a, e in zip(articles, extracted)]
+    summary_overlap = [
+        overlap(split_sentences(a.summary.replace("\n", " ")), split_sentences(e["summary"]))
+        for a, e in zip(articles, extracted)
+    ]
+
+    report = {
+        "documents": len(articles),
+        "newspaper_seconds": round(newspaper_time, 4),
+        "batch_seconds": round(batch_time, 4),
+        "speedup": round(newspaper_time / batch_time, 1) if batch_time else None,
+        "keyword_jaccard": round(sum(keyword_overlap) / len(articles), 3) if articles else None,
+        "summary_sentence_jaccard": round(sum(summary_overlap) / len(articles), 3) if articles else None,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--record", nargs="+", metavar="URL", help="fetch URLs and store them as the corpus")
+    args = parser.parse_args()
+
+    if args.record:
+        record_corpus(args.record, args.corpus)
+    else:
+        run(args.corpus, args.repeat)
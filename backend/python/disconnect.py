@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from profiling import in_thread
+
+logger = logging.getLogger(__name__)
+
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Status nginx uses for "client closed request"; nobody is left to read it
+CLIENT_CLOSED_REQUEST = 499
+
+# Work that was actually not done because the client went away. Calls already
+# running in a thread cannot be interrupted and finish anyway, so they are
+# never counted here.
+work_avoided = {
+    "requests_cancelled": 0,
+    # Page fetches aborted mid-download
+    "scrapes_cancelled": 0,
+    # HTTP search engine requests aborted (thread-based engines excluded)
+    "search_requests_cancelled": 0,
+    # Provider calls that were never started
+    "provider_calls_skipped": 0,
+}
+
+# Set when the client of the current request disconnects; readable from threads
+current_cancel: ContextVar[Optional[threading.Event]] = ContextVar("current_cancel", default=None)
+
+
+def count_cancelled(counter: str, amount: int = 1) -> None:
+    work_avoided[counter] += amount
+
+
+def cancel_requested() -> bool:
+    event = current_cancel.get()
+    return event is not None and event.is_set()
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking call in a thread, with its CPU time attributed to the
+    current profiling stage. The thread cannot be interrupted: cancelling the
+    await abandons the result but the call still runs to completion.
+    """
+    return await asyncio.to_thread(in_thread(func), *args)
+
+
+async def run_until_disconnect(http_request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Run `work` as a task and cancel it as soon as the client disconnects.
+
+    Cancellation propagates into pending scrapes and HTTP searches and sets
+    the request's cancel event, which blocking code checks before starting
+    further provider calls. finally blocks still run, so sessions are closed.
+    """
+    event = threading.Event()
+    token = current_cancel.set(event)
+    task = asyncio.ensure_future(work)
+    current_cancel.reset(token)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling generation")
+                count_cancelled("requests_cancelled")
+                event.set()
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+    finally:
+        # Server shutdown or an outer cancellation must not leave the work running
+        if not task.done():
+            event.set()
+            task.cancel()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from pydantic import BaseModel
 import uvicorn
 from typing import Optional, List, Dict, Any
@@ -6,7 +6,6 @@ from enum import Enum
 from phi.agent import Agent
 from phi.model.groq import Groq
 from phi.model.google import Gemini
-from phi.tools.duckduckgo import DuckDuckGo
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from datetime import datetime
@@ -23,6 +22,15 @@ import json
 import asyncio
 import aiohttp
 from concurrent.futures import ThreadPoolExecutor
+from text_analysis import apply_keywords_and_summaries
+from admission import admission_controller, approx_size, RequestBudget
+from shared_cache import search_cache, page_cache, generation_cache
+from platform_validation import repair_content, PlatformLimits
+from research_corpus import research_corpus, CORPUS_MIN_RESULTS
+from profiling import start_profile, finish_profile, stage, debug_router, PROFILE_ID_HEADER
+from disconnect import run_until_disconnect, run_blocking, count_cancelled, cancel_requested, work_avoided
+from search_backends import build_search, MultiEngineSearch
+import os
 
 
 # Configure logging
@@ -32,7 +40,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pages are read in chunks so an oversized page is aborted before it is buffered
+FETCH_CHUNK_SIZE = 64 * 1024
+
 app = FastAPI()
+app.include_router(debug_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -71,16 +83,28 @@ class Platform(str, Enum):
     PODCAST_SCRIPT = "podcast_script"
     VIDEO_SCRIPT = "video_script"
 
+# Hard limits the prompts below ask for, checked and repaired after generation
+PLATFORM_LIMITS = PlatformLimits(
+    tweet_max_chars=280,
+    thread_min_tweets=5,
+    thread_max_tweets=7,
+    instagram_max_chars=2200,
+    instagram_max_hashtags=20,
+    youtube_title_max_chars=60,
+    reels_max_words=150,
+)
+
 def get_platform_instructions(platform: Platform) -> str:
+    limits = PLATFORM_LIMITS
     current_year = datetime.now().year
     instructions = {
         Platform.INSTAGRAM: f"""
         Generate Instagram content that:
         - Has a powerful first sentence hook
-        - Uses 2-3 short paragraphs (max 2200 characters)
+        - Uses 2-3 short paragraphs (max {limits.instagram_max_chars} characters)
         - Includes 3-5 relevant emojis strategically placed
         - Contains bullet points for key takeaways
-        - Ends with 15-20 targeted hashtags
+        - Ends with 15-{limits.instagram_max_hashtags} targeted hashtags
         - Includes a clear call-to-action
         - Uses line breaks for readability
         - References current {current_year} trends
@@ -99,13 +123,13 @@ def get_platform_instructions(platform: Platform) -> str:
         - Adds 10-15 trending Reels hashtags
         - Specifies transition effects
         - Ends with strong call-to-action
-        - Maximum 150 words for entire script
+        - Maximum {limits.reels_max_words} words for entire script
         Generate ready-to-film content without questions.
         """,
 
         Platform.YOUTUBE: f"""
         Create YouTube video content that:
-        - Has an attention-grabbing title (max 60 characters)
+        - Has an attention-grabbing title (max {limits.youtube_title_max_chars} characters)
         - Includes compelling thumbnail text suggestions
         - Contains detailed video script with timestamps
         - Provides B-roll suggestions
@@ -138,8 +162,8 @@ def get_platform_instructions(platform: Platform) -> str:
         Platform.TWITTER: f"""
         Create Twitter content that:
         - Opens with high-impact first tweet
-        - Structures thread in 5-7 tweets
-        - Each tweet maximum 280 characters
+        - Structures thread in {limits.thread_min_tweets}-{limits.thread_max_tweets} tweets
+        - Each tweet maximum {limits.tweet_max_chars} characters
         - Uses line breaks for readability
         - Incorporates relevant data points
         - Includes 2-3 engaging hooks
@@ -309,6 +333,8 @@ class GenerationRequest(BaseModel):
     platform: Platform
     input_text: str
     serper_api_key: Optional[str] = None
+    # Opt in to reuse an earlier generation for the same topic; off so "Generate" always regenerates
+    use_cache: bool = False
 
 class GenerationResponse(BaseModel):
     content: str
@@ -323,21 +349,55 @@ class WebScrapingResult(BaseModel):
     keywords: List[str]
 
 class WebContent:
-    def __init__(self):
+    def __init__(self, budget: Optional[RequestBudget] = None):
         self.h = html2text.HTML2Text()
         self.h.ignore_links = False
         self.session = aiohttp.ClientSession()
+        self.budget = budget
         
     async def close(self):
         await self.session.close()
         
     async def fetch_url(self, url: str) -> str:
+        """
+        Download a page within the request budget.
+
+        The returned HTML is charged to the budget as approx_size(html) and
+        must be released by the caller. Pages that would exceed the remaining
+        budget are dropped, before buffering when Content-Length says so.
+        """
+        charged = 0
         try:
             async with self.session.get(url, timeout=10) as response:
-                return await response.text()
+                if self.budget and (response.content_length or 0) > self.budget.remaining():
+                    logger.warning(f"Skipping {url}: {response.content_length} bytes exceed the request memory budget")
+                    return ""
+                chunks = []
+                async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+                    if self.budget:
+                        if not self.budget.charge(len(chunk)):
+                            logger.warning(f"Skipping {url}: request memory budget exhausted while downloading")
+                            return ""
+                        charged += len(chunk)
+                    chunks.append(chunk)
+                body = b"".join(chunks)
+                chunks = None
+                html_content = body.decode(response.charset or "utf-8", errors="replace")
+                body = None
+            if self.budget:
+                # Swap the raw byte charge for the size of the decoded text
+                self.budget.release(charged)
+                charged = 0
+                if not self.budget.charge(approx_size(html_content)):
+                    logger.warning(f"Skipping {url}: request memory budget exhausted")
+                    return ""
+            return html_content
         except Exception as e:
             logger.error(f"Error fetching URL {url}: {str(e)}")
             return ""
+        finally:
+            if self.budget and charged:
+                self.budget.release(charged)
 
     def extract_text_from_html(self, html_content: str) -> str:
         try:
@@ -364,54 +424,103 @@ class WebContent:
 
     async def process_url(self, url: str) -> Dict[str, Any]:
         try:
-            html_content = await self.fetch_url(url)
+            cache_key = page_cache.make_key(url)
+            cached = page_cache.get(cache_key)
+            if cached is not None:
+                if self.budget and not self.budget.charge(approx_size(cached["text"])):
+                    logger.warning(f"Skipping {url}: request memory budget exhausted")
+                    return None
+                return cached
+
+            with stage("fetch"):
+                html_content = await self.fetch_url(url)
             if not html_content:
                 return None
 
-            # Try to extract with newspaper3k first
-            article = Article(url)
-            article.download()
-            article.parse()
-            article.nlp()
-
-            # Combine different extraction methods for best results
-            raw_text = self.extract_text_from_html(html_content)
-            cleaned_text = self.clean_text(raw_text)
+            # Already charged to the budget by fetch_url
+            html_size = approx_size(html_content)
+            try:
+                # Reuse the fetched HTML instead of downloading the page again
+                with stage("newspaper_parse"):
+                    article = Article(url)
+                    article.download(input_html=html_content)
+                    article.parse()
+                title = article.title
+                publish_date = str(article.publish_date) if article.publish_date else None
+                authors = article.authors
+
+                # Combine different extraction methods for best results
+                with stage("extract_text"):
+                    raw_text = self.extract_text_from_html(html_content)
+                with stage("clean_text"):
+                    cleaned_text = self.clean_text(raw_text)
+            finally:
+                # Drop the raw HTML and the Article as soon as extraction is done
+                html_content = article = None
+                if self.budget:
+                    self.budget.release(html_size)
+
+            if self.budget and not self.budget.charge(approx_size(cleaned_text)):
+                logger.warning(f"Skipping {url}: request memory budget exhausted")
+                return None
 
-            return {
+            record = {
                 "url": url,
-                "title": article.title,
+                "title": title,
                 "text": cleaned_text,
-                "summary": article.summary,
-                "keywords": article.keywords,
-                "publish_date": str(article.publish_date) if article.publish_date else None,
-                "authors": article.authors,
+                # Filled for the whole batch by apply_keywords_and_summaries
+                "summary": "",
+                "keywords": [],
+                "publish_date": publish_date,
+                "authors": authors,
                 "domain": urlparse(url).netloc
             }
+            page_cache.set(cache_key, record)
+            research_corpus.index(record)
+            return record
+        except asyncio.CancelledError:
+            count_cancelled("scrapes_cancelled")
+            raise
         except Exception as e:
             logger.error(f"Error processing URL {url}: {str(e)}")
             return None
 
 class ContentSource:
-    def __init__(self):
-        self.web_content = WebContent()
+    def __init__(self, budget: Optional[RequestBudget] = None, search: Optional[MultiEngineSearch] = None):
+        self.web_content = WebContent(budget)
+        self.search = search or build_search()
         
     async def search_and_scrape(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         try:
-            # Use DuckDuckGo for initial search
-            search = DuckDuckGo()
-            search_results = search.search(query)
-            
-            if not search_results:
-                return []
-
-            # Extract URLs from search results
-            urls = []
-            for result in search_results[:max_results]:
-                if isinstance(result, dict) and 'link' in result:
-                    urls.append(result['link'])
-                elif hasattr(result, 'url'):
-                    urls.append(result.url)
+            # Answer from the local corpus when it has enough fresh coverage
+            with stage("corpus_search"):
+                local_results = research_corpus.search(query, limit=max_results)
+            if len(local_results) >= min(max_results, CORPUS_MIN_RESULTS):
+                logger.info(f"Serving research for '{query}' from the local corpus")
+                if self.web_content.budget:
+                    local_results = [
+                        r for r in local_results
+                        if self.web_content.budget.charge(approx_size(r['text']))
+                    ]
+                with stage("keywords_summaries"):
+                    return apply_keywords_and_summaries(local_results)
+
+            # Search results are shared across workers through the cache, per engine set and strategy
+            search_key = search_cache.make_key(query, max_results, self.search.signature)
+            urls = search_cache.get(search_key)
+
+            if urls is None:
+                # Query the configured engines in parallel, merged and de-duplicated by URL
+                with stage("search"):
+                    search_results, complete = await self.search.search_with_status(query, max_results)
+
+                if not search_results:
+                    return []
+
+                urls = [result.url for result in search_results]
+                # A deadline-cut answer is used for this request but not cached for others
+                if complete:
+                    search_cache.set(search_key, urls)
 
             # Process URLs concurrently
             tasks = [self.web_content.process_url(url) for url in urls]
@@ -419,7 +528,10 @@ class ContentSource:
             
             # Filter out None results and sort by relevance
             valid_results = [r for r in results if r is not None]
-            return valid_results
+
+            # Keywords and summaries for all sources in one vectorized pass
+            with stage("keywords_summaries"):
+                return apply_keywords_and_summaries(valid_results)
 
         except Exception as e:
             logger.error(f"Error in search_and_scrape: {str(e)}")
@@ -429,9 +541,10 @@ class ContentSource:
         await self.web_content.close()
 
 class ResearchAgent:
-    def __init__(self, model):
+    def __init__(self, model, budget: Optional[RequestBudget] = None, serper_api_key: Optional[str] = None):
         self.model = model
-        self.content_source = ContentSource()
+        self.budget = budget
+        self.content_source = ContentSource(budget, build_search(serper_api_key))
 
     async def research(self, topic: str) -> Dict[str, Any]:
         try:
@@ -451,7 +564,11 @@ class ResearchAgent:
             
             for source in sources:
                 if source and 'text' in source and 'url' in source:
-                    combined_text += f"\nSource: {source['url']}\n{source['text']}\n"
+                    entry = f"\nSource: {source['url']}\n{source['text']}\n"
+                    if self.budget and not self.budget.charge(approx_size(entry)):
+                        logger.warning("Request memory budget reached, truncating source material")
+                        break
+                    combined_text += entry
                     source_info.append({
                         "url": source['url'],
                         "title": source.get('title', 'Untitled'),
@@ -478,7 +595,8 @@ class ResearchAgent:
             6. Provides proper attribution
             """
 
-            synthesis = self.model.complete(synthesis_prompt)
+            with stage("provider_synthesis"):
+                synthesis = await run_blocking(self.model.complete, synthesis_prompt)
             
             return {
                 "content": synthesis.content if hasattr(synthesis, 'content') else "No content generated",
@@ -495,8 +613,50 @@ class ResearchAgent:
     async def close(self):
         await self.content_source.close()
 
+def repair_until_disconnect(platform: str, content: str, model) -> Dict[str, Any]:
+    # Runs in a thread whose await may be abandoned, so skipped calls are counted here
+    repaired = repair_content(platform, content, model, PLATFORM_LIMITS, should_stop=cancel_requested)
+    if repaired['repair_calls_skipped']:
+        count_cancelled("provider_calls_skipped", repaired['repair_calls_skipped'])
+    return repaired
+
 @app.post("/api/generate", response_model=GenerationResponse)
-async def generate_content(request: GenerationRequest):
+async def generate_content(
+    request: GenerationRequest,
+    http_request: Request,
+    http_response: Response,
+    x_writeai_profile: Optional[str] = Header(None),
+):
+    # Stop scraping and provider calls as soon as the client goes away
+    return await run_until_disconnect(
+        http_request, run_generation(request, http_response, x_writeai_profile)
+    )
+
+async def run_generation(
+    request: GenerationRequest,
+    http_response: Response,
+    x_writeai_profile: Optional[str],
+) -> GenerationResponse:
+    # A generation cached by any worker is served without touching the provider.
+    # The key includes the caller's API key, so a hit is only served to a key
+    # that already completed this generation, never to other or invalid keys.
+    generation_key = generation_cache.make_key(
+        request.provider.value, request.model_name, request.api_key,
+        request.platform.value, request.input_text,
+    )
+    if request.use_cache:
+        cached = generation_cache.get(generation_key)
+        if cached is not None:
+            return GenerationResponse(**cached)
+
+    # Fast 503 with Retry-After when the worker is at capacity
+    budget = admission_controller.acquire()
+    # Opt-in sampling profile, enabled by admin header or WRITEAI_PROFILE_SAMPLE_RATE
+    profile = start_profile("new.generate_content", x_writeai_profile)
+    if profile:
+        http_response.headers[PROFILE_ID_HEADER] = profile.id
+    researcher = None
+    write_started = False
     try:
         logger.info(f"Starting content generation for platform: {request.platform.value}")
         
@@ -504,7 +664,7 @@ async def generate_content(request: GenerationRequest):
         model = Gemini(api_key=request.api_key, id=request.model_name) if request.provider == Provider.GEMINI else Groq(api_key=request.api_key, id=request.model_name)
         
         # Initialize research agent
-        researcher = ResearchAgent(model)
+        researcher = ResearchAgent(model, budget, request.serper_api_key)
         research_results = await researcher.research(request.input_text)
         
         # Format sources for inclusion in content
@@ -524,22 +684,54 @@ async def generate_content(request: GenerationRequest):
         Maintain factual accuracy and proper attribution.
         """
 
-        final_content = model.complete(content_prompt)
+        write_started = True
+        with stage("provider_write"):
+            final_content = await run_blocking(model.complete, content_prompt)
+
+        # Check hard platform limits locally and repair only the offending segments
+        if hasattr(final_content, 'content') and final_content.content:
+            with stage("platform_repair"):
+                repaired = await run_blocking(
+                    repair_until_disconnect, request.platform.value, final_content.content, model
+                )
+            final_content.content = repaired['content']
+            if repaired['repair_calls']:
+                logger.info(f"Repaired {request.platform.value} output with {repaired['repair_calls']} model calls")
         
         # Add sources to the end of content
         complete_content = f"{final_content.content}\n{source_citations}" if hasattr(final_content, 'content') else "Content generation failed"
         
-        await researcher.close()
-        
-        return GenerationResponse(
+        response = GenerationResponse(
             content=complete_content,
             summary=research_results['content'][:500] + "..." if len(research_results['content']) > 500 else research_results['content'],
             status="success"
         )
-
+        if hasattr(final_content, 'content'):
+            generation_cache.set(generation_key, response.model_dump())
+        return response
+
+    except asyncio.CancelledError:
+        # A synthesis call already running in its thread still completes;
+        # only the write call is certain not to have started
+        if not write_started:
+            count_cancelled("provider_calls_skipped")
+        raise
     except Exception as e:
         logger.error(f"Error during content generation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Runs on cancellation too, so the scraping session is always closed
+        if researcher:
+            await researcher.close()
+        await finish_profile(profile)
+        admission_controller.release(budget)
+
+@app.get("/api/stats")
+async def get_stats():
+    return {
+        "admission": admission_controller.stats(),
+        "work_avoided": dict(work_avoided),
+    }
 
 @app.get("/api/providers")
 async def get_providers():
@@ -569,6 +761,12 @@ async def get_platforms():
 
 if __name__ == "__main__":
     try:
-        uvicorn.run(app, host="127.0.0.1", port=8000)
+        # WRITEAI_WORKERS > 1 runs several processes sharing the SQLite cache tier
+        workers = int(os.getenv("WRITEAI_WORKERS", "1"))
+        port = int(os.getenv("WRITEAI_PORT", "8000"))
+        if workers > 1:
+            uvicorn.run("new:app", host="127.0.0.1", port=port, workers=workers)
+        else:
+            uvicorn.run(app, host="127.0.0.1", port=port)
     except KeyboardInterrupt:
         print("\nShutting down gracefully...")          
\ No newline at end of file
@@ -0,0 +1,381 @@
+import re
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from phi.model.message import Message
+
+logger = logging.getLogger(__name__)
+
+HASHTAG_RE = re.compile(r"#\w+")
+# Thread markers only ("1/", "1/7", "Tweet 1"); a bare "1." is a list item inside a tweet
+TWEET_MARKER_RE = re.compile(
+    r"^[ \t]*(?:\*\*)?(?:Tweet\s*#?\d{1,2}(?:\s*/\s*\d{1,2})?|\d{1,2}\s*/(?:\s*\d{1,2})?)"
+    r"\s*[:.)\-]?(?:\*\*)?(?=[ \t]|\n|$)[ \t]*",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Section headers of a Reels package: "## Script", "**Script**", "**Voiceover:** text", "Audio: ..."
+HEADING_RE = re.compile(r"^[ \t]*(?:#{1,6}[ \t]+(?P<heading>[^\n]+?)|(?:\*\*|__)(?P<bold>[^*_\n]{1,40}?)(?:\*\*|__))[ \t]*:?[ \t]*$")
+LABEL_RE = re.compile(
+    r"^[ \t]*(?:[-*][ \t]+)?(?P<bold>\*\*|__)?(?P<label>[A-Za-z][\w /&-]{0,40}?)(?:[ \t]*\([^)\n]*\))?[ \t]*"
+    r"(?::[ \t]*(?:\*\*|__)?|(?:\*\*|__)[ \t]*:)[ \t]*(?P<text>.*)$"
+)
+SCRIPT_LABEL_RE = re.compile(r"script|voice[ -]?over|\bvo\b|narration|dialogue|spoken", re.IGNORECASE)
+NON_SCRIPT_LABEL_RE = re.compile(
+    r"overlay|text|audio|music|sound|song|transition|hashtag|caption|cta|call to action|note|edit|effect|b-roll|visual|camera",
+    re.IGNORECASE,
+)
+STAGE_DIRECTION_RE = re.compile(r"\[[^\]]*\]|\([^)]*\)|\b\d{1,2}:\d{2}\b|\b\d+(?:-\d+)?s\b")
+TITLE_RE = re.compile(
+    r"^\s*(?:#+\s*)?(?:\*\*)?(?:Video\s+)?Title(?:\*\*)?\s*[:\-]\s*(?:\*\*)?\s*(.+?)\s*(?:\*\*)?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+class PlatformLimits(BaseModel):
+    """
+    Hard limits a generation prompt asks for. Each module declares the limits
+    its own prompts quote; None means the limit is not checked.
+    """
+    tweet_max_chars: Optional[int] = None
+    thread_min_tweets: Optional[int] = None
+    thread_max_tweets: Optional[int] = None
+    instagram_max_chars: Optional[int] = None
+    instagram_max_hashtags: Optional[int] = None
+    youtube_title_max_chars: Optional[int] = None
+    reels_max_words: Optional[int] = None
+
+
+class ConstraintViolation(BaseModel):
+    rule: str
+    message: str
+    # Offending part of the output; None when the rule applies to the whole output
+    segment: Optional[str] = None
+    # Local fix that needs no model call
+    replacement: Optional[str] = None
+
+
+def strip_span(content: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and content[start].isspace():
+        start += 1
+    while end > start and content[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def tweet_spans(content: str) -> List[Tuple[int, int]]:
+    """(start, end) offsets of each tweet, split on thread markers or blank lines."""
+    markers = list(TWEET_MARKER_RE.finditer(content))
+    if len(markers) >= 2:
+        bounds = [m.start() for m in markers] + [len(content)]
+    else:
+        bounds = [0] + [m.end() for m in re.finditer(r"\n\s*\n", content)] + [len(content)]
+    spans = [strip_span(content, start, end) for start, end in zip(bounds, bounds[1:])]
+    return [(start, end) for start, end in spans if end > start]
+
+
+def split_tweets(content: str) -> List[str]:
+    return [content[start:end] for start, end in tweet_spans(content)]
+
+
+def tweet_body(tweet: str) -> str:
+    return TWEET_MARKER_RE.sub("", tweet, count=1).strip()
+
+
+def merge_short_tweets(tweets: List[str], max_tweets: int, max_chars: Optional[int]) -> List[str]:
+    """Merge the shortest adjacent tweets while the thread is too long and they fit in one tweet."""
+    tweets = list(tweets)
+    while len(tweets) > max_tweets:
+        sizes = [len(tweet_body(a)) + len(tweet_body(b)) + 1 for a, b in zip(tweets, tweets[1:])]
+        i = min(range(len(sizes)), key=sizes.__getitem__)
+        if max_chars and sizes[i] > max_chars:
+            break
+        tweets[i:i + 2] = [f"{tweets[i]}\n{tweet_body(tweets[i + 1])}"]
+    return tweets
+
+
+def mark_split_tweets(reply: str, content: str) -> str:
+    """
+    Give every paragraph of a split reply its own thread marker, so the
+    tweets the model split are not read back as one tweet. Threads written
+    without markers are split on blank lines already and are left alone.
+    """
+    markers = list(TWEET_MARKER_RE.finditer(content))
+    if len(markers) < 2:
+        return reply
+    # Copy the thread's marker style; renumber_thread fixes the numbers
+    marker = markers[0].group(0).strip()
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", reply) if p.strip()]
+    return "\n\n".join(p if TWEET_MARKER_RE.match(p) else f"{marker} {p}" for p in paragraphs)
+
+
+def renumber_thread(content: str) -> str:
+    """Rewrite "n/m" and "Tweet n" markers after tweets were merged or split."""
+    markers = list(TWEET_MARKER_RE.finditer(content))
+    if len(markers) < 2:
+        return content
+    total = len(markers)
+    parts = []
+    last = 0
+    for index, marker in enumerate(markers, 1):
+        numbers = iter([str(index), str(total)])
+        parts.append(content[last:marker.start()])
+        parts.append(re.sub(r"\d{1,2}", lambda m: next(numbers, m.group(0)), marker.group(0)))
+        last = marker.end()
+    parts.append(content[last:])
+    return "".join(parts)
+
+
+def validate_twitter(content: str, limits: PlatformLimits) -> List[ConstraintViolation]:
+    violations = []
+    spans = tweet_spans(content)
+    tweets = [content[start:end] for start, end in spans]
+    max_chars = limits.tweet_max_chars
+    char_limit = f" of at most {max_chars} characters" if max_chars else ""
+    message = f"Thread has {len(tweets)} tweets, expected {limits.thread_min_tweets or 1}-{limits.thread_max_tweets or 'any'}"
+    if limits.thread_max_tweets and len(tweets) > limits.thread_max_tweets:
+        merged = merge_short_tweets(tweets, limits.thread_max_tweets, max_chars)
+        if len(merged) < len(tweets):
+            # Merge locally where adjacent tweets fit together
+            violations.append(ConstraintViolation(
+                rule="thread_length",
+                message=message,
+                segment=content[spans[0][0]:spans[-1][1]],
+                replacement="\n\n".join(merged),
+            ))
+        else:
+            sizes = [len(a) + len(b) for a, b in zip(tweets, tweets[1:])]
+            i = min(range(len(sizes)), key=sizes.__getitem__)
+            violations.append(ConstraintViolation(
+                rule="thread_length",
+                message=f"{message}. Combine these two tweets into one tweet{char_limit}, keeping the leading marker",
+                segment=content[spans[i][0]:spans[i + 1][1]],
+            ))
+    elif tweets and limits.thread_min_tweets and len(tweets) < limits.thread_min_tweets:
+        i = max(range(len(tweets)), key=lambda k: len(tweets[k]))
+        count = limits.thread_min_tweets - len(tweets) + 1
+        violations.append(ConstraintViolation(
+            rule="thread_length",
+            message=f"{message}. Split this tweet into {count} tweets{char_limit} each, separated by blank lines",
+            segment=tweets[i],
+        ))
+    for tweet in tweets:
+        body = tweet_body(tweet)
+        if max_chars and len(body) > max_chars:
+            violations.append(ConstraintViolation(
+                rule="tweet_length",
+                message=f"Tweet is {len(body)} characters, limit is {max_chars}",
+                segment=body,
+            ))
+    return violations
+
+
+def validate_instagram(content: str, limits: PlatformLimits) -> List[ConstraintViolation]:
+    violations = []
+    hashtags = HASHTAG_RE.findall(content)
+    max_hashtags = limits.instagram_max_hashtags
+    if max_hashtags is not None and len(hashtags) > max_hashtags:
+        # Keep the first hashtags and drop the rest locally
+        extra = set(range(max_hashtags, len(hashtags)))
+        counter = iter(range(len(hashtags)))
+        trimmed = HASHTAG_RE.sub(lambda m: "" if next(counter) in extra else m.group(0), content)
+        violations.append(ConstraintViolation(
+            rule="hashtag_count",
+            message=f"Post has {len(hashtags)} hashtags, limit is {max_hashtags}",
+            segment=content,
+            replacement=re.sub(r"[ \t]{2,}", " ", trimmed).strip(),
+        ))
+    if limits.instagram_max_chars and len(content) > limits.instagram_max_chars:
+        violations.append(ConstraintViolation(
+            rule="caption_length",
+            message=f"Caption is {len(content)} characters, limit is {limits.instagram_max_chars}",
+            segment=content,
+        ))
+    return violations
+
+
+def validate_youtube(content: str, limits: PlatformLimits) -> List[ConstraintViolation]:
+    match = TITLE_RE.search(content)
+    if not match or not limits.youtube_title_max_chars:
+        return []
+    title = match.group(1).strip().strip('"')
+    if len(title) <= limits.youtube_title_max_chars:
+        return []
+    return [ConstraintViolation(
+        rule="title_length",
+        message=f"Title is {len(title)} characters, limit is {limits.youtube_title_max_chars}",
+        segment=title,
+    )]
+
+
+def script_sections(content: str) -> List[Tuple[int, int]]:
+    """
+    (start, end) offsets of the spoken script/voiceover sections of a Reels
+    package, leaving out hook labels, overlays, audio, transitions and hashtags.
+    A section runs until the next heading, bold label or non-script label;
+    plain labels such as "Scene 2:" inside the script do not end it.
+    """
+    sections = []
+    current = None
+    offset = 0
+    for line in content.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        heading = HEADING_RE.match(stripped)
+        label = None if heading else LABEL_RE.match(stripped)
+        label_text = (heading.group("heading") or heading.group("bold")) if heading else None
+        if label and (
+            label.group("bold")
+            or current is None
+            or SCRIPT_LABEL_RE.search(label.group("label"))
+            or NON_SCRIPT_LABEL_RE.search(label.group("label"))
+        ):
+            label_text = label.group("label")
+        if label_text is not None:
+            if current is not None:
+                sections.append(strip_span(content, current, offset))
+                current = None
+            if SCRIPT_LABEL_RE.search(label_text):
+                current = offset + (label.start("text") if label else len(line))
+        offset += len(line)
+    if current is not None:
+        sections.append(strip_span(content, current, len(content)))
+    return [(start, end) for start, end in sections if end > start]
+
+
+def spoken_words(text: str) -> List[str]:
+    text = STAGE_DIRECTION_RE.sub(" ", text)
+    # Line labels inside the script ("Scene 2:", "VO:") are not spoken
+    text = re.sub(r"(?m)^[ \t]*(?:[-*][ \t]+)?[A-Za-z][\w ]{0,20}:", " ", text)
+    return [w for w in re.sub(r"[*_>#`]", " ", text).split() if not w.startswith("#") and re.search(r"\w", w)]
+
+
+def validate_instagram_reels(content: str, limits: PlatformLimits) -> List[ConstraintViolation]:
+    max_words = limits.reels_max_words
+    if not max_words:
+        return []
+    sections = [content[start:end] for start, end in script_sections(content)]
+    counts = [len(spoken_words(section)) for section in sections]
+    total = sum(counts)
+    if total <= max_words:
+        return []
+    # Only the script is sent for repair; the longest section absorbs the cut
+    i = max(range(len(sections)), key=counts.__getitem__)
+    target = max(counts[i] - (total - max_words), 1)
+    return [ConstraintViolation(
+        rule="script_words",
+        message=f"Script is {total} words, limit is {max_words}; shorten this part to at most {target} spoken words",
+        segment=sections[i],
+    )]
+
+
+# Applied to a model reply for a rule before it is spliced in, with the current content
+REPLY_FIXERS: Dict[str, Callable[[str, str], str]] = {
+    "thread_length": mark_split_tweets,
+}
+
+# Applied after segments are spliced back in
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "twitter": renumber_thread,
+}
+
+# Keyed by Platform value so both api.py and new.py can use it
+VALIDATORS: Dict[str, Callable[[str, PlatformLimits], List[ConstraintViolation]]] = {
+    "twitter": validate_twitter,
+    "instagram": validate_instagram,
+    "youtube": validate_youtube,
+    "instagram_reels": validate_instagram_reels,
+}
+
+
+def validate_content(platform: str, content: str, limits: PlatformLimits) -> List[ConstraintViolation]:
+    validator = VALIDATORS.get(platform)
+    return validator(content, limits) if validator else []
+
+
+def complete(model, prompt: str) -> Optional[str]:
+    """
+    One plain completion from a phi model. Agents leave their tools registered
+    on the model they share, so the prompt goes through a fresh instance of the
+    same provider; its usage is added to the shared model's metrics.
+    """
+    plain = type(model)(id=model.id, api_key=model.api_key)
+    response = plain.response(messages=[Message(role="user", content=prompt)])
+    for key, value in plain.metrics.items():
+        if isinstance(value, list):
+            model.metrics.setdefault(key, []).extend(value)
+        elif isinstance(value, (int, float)) and key != "time_to_first_token":
+            model.metrics[key] = model.metrics.get(key, 0) + value
+    return response.content
+
+
+def repair_content(
+    platform: str,
+    content: str,
+    model,
+    limits: PlatformLimits,
+    max_rounds: int = 3,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict:
+    """
+    Fix violations of `limits` without regenerating the whole output.
+
+    Local fixes are applied directly; every other offending segment is sent to
+    the model on its own and spliced back in. `should_stop` is checked before
+    each model call, and the calls it prevents are reported as skipped.
+    Returns the repaired content, the number of model calls made and skipped,
+    and any violations left unresolved.
+    """
+    repair_calls = 0
+    repair_calls_skipped = 0
+    stopped = False
+    violations = validate_content(platform, content, limits)
+    for _ in range(max_rounds):
+        repairable = [v for v in violations if v.segment]
+        if not repairable:
+            break
+        for index, violation in enumerate(repairable):
+            if violation.segment not in content:
+                continue
+            replacement = violation.replacement
+            if replacement is None and should_stop and should_stop():
+                stopped = True
+                repair_calls_skipped = sum(
+                    1 for v in repairable[index:] if v.replacement is None and v.segment in content
+                )
+                break
+            if replacement is None:
+                prompt = f"""
+                Rewrite the following {platform} text so that it satisfies this rule: {violation.message}.
+                Keep the meaning, tone, hashtags and emojis where possible.
+                Return only the rewritten text, without any explanation.
+
+                Text:
+                {violation.segment}
+                """
+                try:
+                    result = complete(model, prompt)
+                    repair_calls += 1
+                except Exception as e:
+                    logger.error(f"Error repairing {violation.rule}: {str(e)}")
+                    continue
+                replacement = result.strip() if result else None
+                fix_reply = REPLY_FIXERS.get(violation.rule)
+                if replacement and fix_reply:
+                    replacement = fix_reply(replacement, content)
+            if replacement:
+                content = content.replace(violation.segment, replacement, 1)
+        if stopped:
+            break
+        normalize = NORMALIZERS.get(platform)
+        if normalize:
+            content = normalize(content)
+        violations = validate_content(platform, content, limits)
+
+    if violations:
+        logger.warning(f"Unresolved {platform} violations: {[v.rule for v in violations]}")
+    return {
+        "content": content,
+        "repair_calls": repair_calls,
+        "repair_calls_skipped": repair_calls_skipped,
+        "violations": violations,
+    }
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # profiling falls back to stage timings only
+    Profiler = None
+    SpeedscopeRenderer = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-WriteAI-Profile"
+PROFILE_ID_HEADER = "X-WriteAI-Profile-Id"
+PROFILE_TOKEN = os.getenv("WRITEAI_PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("WRITEAI_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("WRITEAI_PROFILE_INTERVAL", "0.001"))
+PROFILE_DIR = os.getenv("WRITEAI_PROFILE_DIR", "profiles")
+# Oldest profiles beyond this many are deleted each time one is stored
+PROFILE_MAX_FILES = int(os.getenv("WRITEAI_PROFILE_MAX_FILES", "200"))
+
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+
+class RequestProfile:
+    """Sampling profile and per-stage wall/CPU breakdown for one request."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.started_at = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled") if Profiler else None
+
+    def record(self, stage_name: str, wall: float, cpu: float) -> None:
+        entry = self.stages.setdefault(stage_name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+        entry["calls"] += 1
+        entry["wall_seconds"] += wall
+        entry["cpu_seconds"] += cpu
+
+    def add_cpu(self, stage_name: str, cpu: float) -> None:
+        entry = self.stages.setdefault(stage_name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+        entry["cpu_seconds"] += cpu
+
+    def report(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "wall_seconds": time.perf_counter() - self._wall_start,
+            "cpu_seconds": time.process_time() - self._cpu_start,
+            "stages": self.stages,
+            "flamegraph": self.profiler is not None,
+        }
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    if header_value and PROFILE_TOKEN and header_value == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile(name: str, header_value: Optional[str]) -> Optional[RequestProfile]:
+    """Start profiling the current request when asked for by header or sampling."""
+    if not should_profile(header_value):
+        return None
+    profile = RequestProfile(name)
+    if profile.profiler:
+        profile.profiler.start()
+    current_profile.set(profile)
+    return profile
+
+
+async def finish_profile(profile: Optional[RequestProfile]) -> None:
+    if profile is None:
+        return
+    current_profile.set(None)
+    # The sampler must be stopped on the thread that started it
+    if profile.profiler:
+        profile.profiler.stop()
+    # Rendering and file writes stay off the event loop
+    await asyncio.to_thread(store_profile, profile, profile.report())
+
+
+def store_profile(profile: RequestProfile, report: Dict) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if profile.profiler:
+            with open(os.path.join(PROFILE_DIR, f"{profile.id}.speedscope.json"), "w") as f:
+                f.write(profile.profiler.output(renderer=SpeedscopeRenderer()))
+        with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Stored profile {profile.id} for {profile.name}")
+        prune_profiles()
+    except Exception as e:
+        logger.error(f"Error storing profile {profile.id}: {str(e)}")
+
+
+def stored_profiles() -> List[str]:
+    """Ids of stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted(
+        (n for n in os.listdir(PROFILE_DIR) if n.endswith(".json") and not n.endswith(".speedscope.json")),
+        key=profile_mtime,
+        reverse=True,
+    )
+    return [n[:-len(".json")] for n in names]
+
+
+def profile_mtime(name: str) -> float:
+    # Another worker may prune the file between listing and stat
+    try:
+        return os.path.getmtime(os.path.join(PROFILE_DIR, name))
+    except OSError:
+        return 0.0
+
+
+def prune_profiles(max_profiles: int = PROFILE_MAX_FILES) -> int:
+    """Delete the oldest profiles beyond `max_profiles`, both report and flamegraph."""
+    expired = stored_profiles()[max_profiles:]
+    for profile_id in expired:
+        for suffix in (".json", ".speedscope.json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{profile_id}{suffix}"))
+            except FileNotFoundError:
+                pass
+    return len(expired)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a pipeline stage; a no-op unless the current request is profiled.
+
+    CPU is measured on the event loop thread, so it also includes other
+    coroutines that ran while the stage was awaiting. Work run in threads
+    adds its own CPU to the stage through `in_thread`.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    token = current_stage.set(name)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        profile.record(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+        current_stage.reset(token)
+
+
+def in_thread(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a function run by asyncio.to_thread to add its thread CPU time to the current stage."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        stage_name = current_stage.get()
+        if profile is None or stage_name is None:
+            return func(*args, **kwargs)
+        cpu_start = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_cpu(stage_name, time.thread_time() - cpu_start)
+    return wrapper
+
+
+def check_admin(token: Optional[str]) -> None:
+    if not PROFILE_TOKEN or token != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this token")
+
+
+def profile_path(profile_id: str, suffix: str) -> str:
+    # Profile ids are uuid4 hex strings; anything else never maps to a file
+    if not profile_id.isalnum():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{suffix}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return path
+
+
+debug_router = APIRouter(prefix="/api/debug")
+
+
+@debug_router.get("/profiles")
+async def list_profiles(x_writeai_profile: Optional[str] = Header(None)):
+    check_admin(x_writeai_profile)
+    return {"profiles": stored_profiles()}
+
+
+@debug_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_writeai_profile: Optional[str] = Header(None)):
+    check_admin(x_writeai_profile)
+    with open(profile_path(profile_id, ".json")) as f:
+        return json.load(f)
+
+
+@debug_router.get("/profiles/{profile_id}/flamegraph")
+async def get_flamegraph(profile_id: str, x_writeai_profile: Optional[str] = Header(None)):
+    """Speedscope file; open it at https://www.speedscope.app"""
+    check_admin(x_writeai_profile)
+    return FileResponse(profile_path(profile_id, ".speedscope.json"), media_type="application/json")
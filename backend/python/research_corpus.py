@@ -0,0 +1,193 @@
+import os
+import re
+import math
+import time
+import sqlite3
+import logging
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from text_analysis import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = os.getenv("WRITEAI_CORPUS_PATH", "writeai_corpus.sqlite3")
+CORPUS_MAX_AGE = int(os.getenv("WRITEAI_CORPUS_MAX_AGE", str(7 * 24 * 3600)))
+# Share of query terms a document must contain to count as covering the topic
+CORPUS_MIN_TERM_FRACTION = float(os.getenv("WRITEAI_CORPUS_MIN_TERM_FRACTION", "0.6"))
+# Share of query terms the title must contain, so a page is about the topic rather than mentioning it
+CORPUS_MIN_TITLE_FRACTION = float(os.getenv("WRITEAI_CORPUS_MIN_TITLE_FRACTION", "0.5"))
+# Matching pages needed before research is served without hitting the web
+CORPUS_MIN_RESULTS = int(os.getenv("WRITEAI_CORPUS_MIN_RESULTS", "3"))
+# Pages older than max_age are deleted at startup and every N indexed pages
+EVICT_EVERY = int(os.getenv("WRITEAI_CORPUS_EVICT_EVERY", "200"))
+
+# Same word boundaries as the FTS5 unicode61 tokenizer
+TERM_RE = re.compile(r"[^\W_]+")
+
+# Instruction words of a generation prompt that say nothing about the topic
+PROMPT_WORDS = {
+    "write", "create", "generate", "draft", "post", "posts", "article", "blog", "thread",
+    "tweet", "tweets", "instagram", "reel", "reels", "youtube", "shorts", "linkedin",
+    "tiktok", "medium", "substack", "wordpress", "newsletter", "email", "video", "script",
+    "podcast", "content", "caption", "landing", "page", "website",
+}
+STOPWORD_SET = set(STOPWORDS.tolist()) | PROMPT_WORDS
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics, as unicode61 does when indexing."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class ResearchCorpus:
+    """
+    Local full-text index (SQLite FTS5) of every page extracted by process_url.
+
+    Consulted before searching the web, so recurring subject areas are
+    answered from disk in milliseconds.
+    """
+
+    def __init__(self, path: str = CORPUS_PATH, max_age: int = CORPUS_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._conn = None
+        self._pid = None
+        self._indexed = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so reopen in each worker process
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT,
+                    text TEXT,
+                    domain TEXT,
+                    publish_date TEXT,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    title, text, content='documents', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                    INSERT INTO documents_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+                    INSERT INTO documents_fts(documents_fts, rowid, title, text)
+                    VALUES ('delete', old.id, old.title, old.text);
+                END;
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+            self._indexed = 0
+            self.evict_expired()
+        return self._conn
+
+    def evict_expired(self) -> int:
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM documents WHERE indexed_at <= ?", (time.time() - self.max_age,)
+            )
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Corpus eviction error: {str(e)}")
+            return 0
+
+    def index(self, record: Dict[str, Any]) -> None:
+        if not record.get("text"):
+            return
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("DELETE FROM documents WHERE url = ?", (record["url"],))
+                conn.execute(
+                    "INSERT INTO documents (url, title, text, domain, publish_date, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        record["url"],
+                        record.get("title"),
+                        record["text"],
+                        record.get("domain"),
+                        record.get("publish_date"),
+                        time.time(),
+                    ),
+                )
+            self._indexed += 1
+            if self._indexed % EVICT_EVERY == 0:
+                self.evict_expired()
+        except Exception as e:
+            logger.error(f"Error indexing {record.get('url')}: {str(e)}")
+
+    @staticmethod
+    def query_terms(query: str) -> List[str]:
+        terms = [t for t in TERM_RE.findall(fold(query)) if len(t) > 1 and t not in STOPWORD_SET]
+        return list(dict.fromkeys(terms))
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        max_age: Optional[int] = None,
+        min_term_fraction: float = CORPUS_MIN_TERM_FRACTION,
+        min_title_fraction: float = CORPUS_MIN_TITLE_FRACTION,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fresh documents covering the topic, best BM25 match first.
+
+        Any query term may match; a document is kept only if it contains at
+        least `min_term_fraction` of the topic terms (all of them for topics
+        of one or two terms) and its title at least `min_title_fraction`.
+        """
+        terms = self.query_terms(query)
+        if not terms:
+            return []
+        max_age = self.max_age if max_age is None else max_age
+        try:
+            rows = self._connection().execute(
+                "SELECT d.url, d.title, d.text, d.domain, d.publish_date "
+                "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                "WHERE documents_fts MATCH ? AND d.indexed_at > ? "
+                "ORDER BY bm25(documents_fts, 5.0, 1.0) LIMIT ?",
+                (" OR ".join(f'"{t}"' for t in terms), time.time() - max_age, limit * 4),
+            ).fetchall()
+        except Exception as e:
+            logger.error(f"Corpus search error: {str(e)}")
+            return []
+
+        if len(terms) <= 2:
+            required = len(terms)
+        else:
+            required = max(1, math.ceil(len(terms) * min_term_fraction))
+        required_in_title = max(1, math.ceil(len(terms) * min_title_fraction))
+        covering = []
+        for row in rows:
+            title_words = set(TERM_RE.findall(fold(row[1] or "")))
+            words = title_words | set(TERM_RE.findall(fold(row[2])))
+            if (
+                sum(term in words for term in terms) >= required
+                and sum(term in title_words for term in terms) >= required_in_title
+            ):
+                covering.append(row)
+        return [
+            {
+                "url": url,
+                "title": title,
+                "text": text,
+                "summary": "",
+                "keywords": [],
+                "publish_date": publish_date,
+                "authors": [],
+                "domain": domain,
+            }
+            for url, title, text, domain, publish_date in covering[:limit]
+        ]
+
+
+research_corpus = ResearchCorpus()
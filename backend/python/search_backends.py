@@ -0,0 +1,210 @@
+import os
+import json
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+import aiohttp
+from pydantic import BaseModel
+from phi.tools.duckduckgo import DuckDuckGo
+
+from disconnect import run_blocking, count_cancelled
+
+logger = logging.getLogger(__name__)
+
+SERPER_URL = "https://google.serper.dev/search"
+SEARCH_DEADLINE = float(os.getenv("WRITEAI_SEARCH_DEADLINE", "5"))
+SEARCH_FIXTURES = os.getenv("WRITEAI_SEARCH_FIXTURES")
+# "merge" waits for every engine up to the deadline, "first_good" takes the first useful answer
+SEARCH_STRATEGY = os.getenv("WRITEAI_SEARCH_STRATEGY", "merge")
+SEARCH_STRATEGIES = ("merge", "first_good")
+
+
+class SearchResult(BaseModel):
+    url: str
+    title: str = ""
+    snippet: str = ""
+    engine: str = ""
+
+
+class SearchBackend(ABC):
+    name: str = ""
+    # Whether cancelling a pending search actually aborts the request
+    cancellable: bool = True
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        ...
+
+
+class DuckDuckGoBackend(SearchBackend):
+    name = "duckduckgo"
+    # The client is synchronous and its thread runs to completion
+    cancellable = False
+
+    async def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        # The DuckDuckGo client is synchronous, keep it off the event loop
+        response = await run_blocking(DuckDuckGo().duckduckgo_search, query, max_results)
+        return [
+            SearchResult(url=r["href"], title=r.get("title", ""), snippet=r.get("body", ""), engine=self.name)
+            for r in json.loads(response)
+            if r.get("href")
+        ]
+
+
+class SerperBackend(SearchBackend):
+    name = "serper"
+
+    def __init__(self, api_key: str, timeout: float = 10):
+        self.api_key = api_key
+        self.timeout = timeout
+
+    async def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                SERPER_URL,
+                json={"q": query, "num": max_results},
+                headers={"X-API-KEY": self.api_key, "Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
+                response.raise_for_status()
+                data = await response.json()
+        return [
+            SearchResult(url=r["link"], title=r.get("title", ""), snippet=r.get("snippet", ""), engine=self.name)
+            for r in data.get("organic", [])[:max_results]
+            if r.get("link")
+        ]
+
+
+class FixtureBackend(SearchBackend):
+    """
+    Canned results for local testing, from a dict or a JSON file mapping
+    queries to lists of {"url", "title", "snippet"}. The "*" entry is used
+    for unknown queries; `delay` simulates a slow engine.
+    """
+
+    name = "fixture"
+
+    def __init__(self, fixtures: Optional[Dict[str, List[dict]]] = None, path: Optional[str] = None, delay: float = 0):
+        if path:
+            with open(path, encoding="utf-8") as f:
+                fixtures = json.load(f)
+        self.fixtures = fixtures or {}
+        self.delay = delay
+
+    async def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        results = self.fixtures.get(query, self.fixtures.get("*", []))
+        return [SearchResult(**{**r, "engine": self.name}) for r in results[:max_results]]
+
+
+def normalize_url(url: str) -> str:
+    parsed = urlparse(url.strip())
+    path = parsed.path.rstrip("/") or "/"
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path, parsed.params, parsed.query, ""))
+
+
+def merge_results(result_sets: List[List[SearchResult]], max_results: Optional[int] = None) -> List[SearchResult]:
+    """Interleave result sets by rank and drop duplicate URLs."""
+    merged = []
+    seen = set()
+    for rank in range(max((len(r) for r in result_sets), default=0)):
+        for results in result_sets:
+            if rank >= len(results):
+                continue
+            key = normalize_url(results[rank].url)
+            if key not in seen:
+                seen.add(key)
+                merged.append(results[rank])
+    return merged[:max_results] if max_results else merged
+
+
+class MultiEngineSearch:
+    """
+    Query several backends in parallel under one deadline.
+
+    By default results from every engine that answered in time are merged and
+    de-duplicated by URL. With `first_good`, the first engine to return at
+    least `min_results` results wins and the others are cancelled.
+    """
+
+    def __init__(
+        self,
+        backends: List[SearchBackend],
+        deadline: float = SEARCH_DEADLINE,
+        min_results: int = 1,
+        first_good: bool = False,
+    ):
+        self.backends = backends
+        self.deadline = deadline
+        self.min_results = min_results
+        self.first_good = first_good
+
+    @property
+    def signature(self) -> str:
+        """Engines and strategy behind these results, for cache keys."""
+        strategy = "first_good" if self.first_good else "merge"
+        return f"{'+'.join(b.name for b in self.backends)}:{strategy}"
+
+    async def search(self, query: str, max_results: int = 5, first_good: Optional[bool] = None) -> List[SearchResult]:
+        results, _ = await self.search_with_status(query, max_results, first_good)
+        return results
+
+    async def search_with_status(
+        self, query: str, max_results: int = 5, first_good: Optional[bool] = None
+    ) -> Tuple[List[SearchResult], bool]:
+        """Results, and whether they are complete: False when the deadline dropped an engine."""
+        if first_good is None:
+            first_good = self.first_good
+        tasks = {
+            asyncio.ensure_future(backend.search(query, max_results)): backend
+            for backend in self.backends
+        }
+        answered: Dict[SearchBackend, List[SearchResult]] = {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        pending = set(tasks)
+        try:
+            while pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend = tasks[task]
+                    try:
+                        answered[backend] = task.result()
+                    except Exception as e:
+                        logger.error(f"Search backend {backend.name} failed: {str(e)}")
+                        continue
+                    if first_good and len(answered[backend]) >= self.min_results:
+                        return answered[backend][:max_results], True
+        except asyncio.CancelledError:
+            aborted = sum(1 for t in pending if tasks[t].cancellable)
+            if aborted:
+                count_cancelled("search_requests_cancelled", aborted)
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if pending:
+            logger.warning(f"Search deadline hit, skipped: {[tasks[t].name for t in pending]}")
+        # Keep the configured backend order so the preferred engine ranks first
+        return merge_results([answered[b] for b in self.backends if b in answered], max_results), not pending
+
+
+def build_search(serper_api_key: Optional[str] = None) -> MultiEngineSearch:
+    if SEARCH_STRATEGY not in SEARCH_STRATEGIES:
+        logger.warning(f"Unknown WRITEAI_SEARCH_STRATEGY '{SEARCH_STRATEGY}', using merge")
+    first_good = SEARCH_STRATEGY == "first_good"
+    if SEARCH_FIXTURES:
+        return MultiEngineSearch([FixtureBackend(path=SEARCH_FIXTURES)], first_good=first_good)
+    backends: List[SearchBackend] = []
+    if serper_api_key:
+        backends.append(SerperBackend(serper_api_key))
+    backends.append(DuckDuckGoBackend())
+    return MultiEngineSearch(backends, first_good=first_good)
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("WRITEAI_CACHE_PATH", "writeai_cache.sqlite3")
+# Expired rows are deleted when a worker opens the cache and every N writes
+PURGE_EVERY = int(os.getenv("WRITEAI_CACHE_PURGE_EVERY", "500"))
+
+
+class SharedCache:
+    """
+    Key/value cache in a local SQLite database in WAL mode.
+
+    Every uvicorn worker opens the same file, so an entry written by one
+    worker is a hit for all of them. Values are stored as JSON.
+    """
+
+    def __init__(self, namespace: str, ttl: int, path: str = CACHE_PATH):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so reopen in each worker process
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+            self._conn = conn
+            self._pid = os.getpid()
+            self._writes = 0
+            self.purge_expired()
+        return self._conn
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, time.time()),
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Cache read error ({self.namespace}): {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, default=str), time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self.purge_expired()
+        except Exception as e:
+            logger.error(f"Cache write error ({self.namespace}): {str(e)}")
+
+    def purge_expired(self) -> int:
+        """Delete expired rows of every namespace sharing the file."""
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (time.time(),)
+            )
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Cache purge error: {str(e)}")
+            return 0
+
+
+search_cache = SharedCache("search", ttl=int(os.getenv("WRITEAI_SEARCH_CACHE_TTL", "3600")))
+page_cache = SharedCache("page", ttl=int(os.getenv("WRITEAI_PAGE_CACHE_TTL", "86400")))
+generation_cache = SharedCache("generation", ttl=int(os.getenv("WRITEAI_GENERATION_CACHE_TTL", "3600")))
@@ -0,0 +1,182 @@
+import re
+import math
+import logging
+from typing import List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Unicode-aware: a letter followed by letters, digits, apostrophes or hyphens
+WORD_RE = re.compile(r"[^\W\d_][\w'-]+")
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Words ending in a period that do not end a sentence
+ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "inc", "ltd",
+    "co", "corp", "dept", "gen", "gov", "sen", "rep", "rev", "capt", "col", "lt", "sgt",
+    "fig", "approx", "est", "vol", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+    "sep", "sept", "oct", "nov", "dec",
+})
+
+# Ideal summary sentence length in words, same value newspaper uses for scoring
+IDEAL_SENTENCE_LENGTH = 20
+
+STOPWORDS = np.array(sorted({
+    "a", "about", "above", "after", "again", "against", "all", "also", "am", "an", "and",
+    "any", "are", "aren't", "as", "at", "be", "because", "been", "before", "being", "below",
+    "between", "both", "but", "by", "can", "could", "did", "didn't", "do", "does", "doesn't",
+    "doing", "don't", "down", "during", "each", "even", "ever", "every", "few", "for", "from",
+    "further", "get", "gets", "got", "had", "has", "hasn't", "have", "haven't", "having", "he",
+    "her", "here", "hers", "herself", "him", "himself", "his", "how", "however", "i", "if",
+    "in", "into", "is", "isn't", "it", "it's", "its", "itself", "just", "let's", "like", "made",
+    "make", "many", "may", "me", "might", "more", "most", "much", "must", "my", "myself",
+    "new", "no", "nor", "not", "now", "of", "off", "on", "once", "one", "only", "or", "other",
+    "our", "ours", "ourselves", "out", "over", "own", "per", "said", "same", "say", "says",
+    "she", "should", "since", "so", "some", "still", "such", "than", "that", "that's", "the",
+    "their", "theirs", "them", "themselves", "then", "there", "there's", "these", "they",
+    "this", "those", "through", "to", "too", "two", "under", "until", "up", "us", "use",
+    "used", "very", "via", "was", "wasn't", "we", "well", "were", "weren't", "what", "when",
+    "where", "which", "while", "who", "whom", "why", "will", "with", "without", "won't",
+    "would", "year", "years", "yet", "you", "your", "yours", "yourself", "yourselves",
+}))
+
+
+def ends_with_abbreviation(sentence: str) -> bool:
+    last = sentence.rsplit(None, 1)[-1]
+    if not last.endswith("."):
+        return False
+    word = last[:-1].lstrip("(\"'").lower()
+    # Titles and months, single initials ("J. K."), dotted forms ("U.S.", "e.g.")
+    return (
+        word in ABBREVIATIONS
+        or (len(word) == 1 and word.isalpha())
+        or ("." in word and all(0 < len(part) <= 2 for part in word.split(".")))
+    )
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences: List[str] = []
+    for piece in SENTENCE_RE.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        # Rejoin splits after abbreviations or before a lowercase continuation
+        if sentences and (ends_with_abbreviation(sentences[-1]) or piece[0].islower()):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def extract_keywords_and_summaries(
+    documents: List[Dict[str, Any]],
+    max_keywords: int = 10,
+    max_sentences: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Batch replacement for newspaper's article.nlp().
+
+    Builds one TF-IDF matrix over every document of a request and scores all
+    sentences in a single vectorized pass. Returns a list aligned with
+    `documents`, each entry holding "keywords" and "summary".
+    """
+    n_docs = len(documents)
+    results = [{"keywords": [], "summary": ""} for _ in range(n_docs)]
+    if n_docs == 0:
+        return results
+
+    sentences: List[str] = []
+    sentence_doc: List[int] = []
+    sentence_pos: List[float] = []
+    tokens: List[str] = []
+    token_sentence: List[int] = []
+    title_tokens: List[str] = []
+    title_doc: List[int] = []
+
+    for doc_idx, doc in enumerate(documents):
+        doc_sentences = split_sentences(doc.get("text") or "")
+        for pos, sentence in enumerate(doc_sentences):
+            words = WORD_RE.findall(sentence.lower())
+            if not words:
+                continue
+            sentence_id = len(sentences)
+            sentences.append(sentence)
+            sentence_doc.append(doc_idx)
+            sentence_pos.append(pos / len(doc_sentences))
+            tokens.extend(words)
+            token_sentence.extend([sentence_id] * len(words))
+        words = WORD_RE.findall((doc.get("title") or "").lower())
+        title_tokens.extend(words)
+        title_doc.extend([doc_idx] * len(words))
+
+    if not tokens:
+        return results
+
+    n_sentences = len(sentences)
+    vocab, term_ids = np.unique(np.array(tokens), return_inverse=True)
+    token_sentence_arr = np.array(token_sentence)
+    sentence_doc_arr = np.array(sentence_doc)
+    token_doc = sentence_doc_arr[token_sentence_arr]
+
+    informative = ~np.isin(vocab, STOPWORDS) & (np.char.str_len(vocab) > 2)
+    keep = informative[term_ids]
+
+    # Term frequencies per document over informative terms only
+    tf = np.zeros((n_docs, len(vocab)))
+    np.add.at(tf, (token_doc[keep], term_ids[keep]), 1.0)
+    doc_lengths = tf.sum(axis=1, keepdims=True)
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    tfidf = np.divide(tf, doc_lengths, out=np.zeros_like(tf), where=doc_lengths > 0) * idf
+
+    # Title terms that also appear in the body, as a (doc, term) mask
+    title_mask = np.zeros((n_docs, len(vocab)), dtype=bool)
+    if title_tokens:
+        title_arr = np.array(title_tokens)
+        idx = np.searchsorted(vocab, title_arr).clip(max=len(vocab) - 1)
+        found = vocab[idx] == title_arr
+        title_mask[np.array(title_doc)[found], idx[found]] = True
+    title_mask &= informative
+
+    # Sentence scores: summed TF-IDF weight normalised by length, boosted by
+    # title overlap and position in the document
+    token_weights = tfidf[token_doc, term_ids] * keep
+    scores = np.bincount(token_sentence_arr, weights=token_weights, minlength=n_sentences)
+    lengths = np.bincount(token_sentence_arr, minlength=n_sentences)
+    title_hits = np.bincount(
+        token_sentence_arr,
+        weights=title_mask[token_doc, term_ids].astype(float),
+        minlength=n_sentences,
+    )
+    title_sizes = np.maximum(title_mask.sum(axis=1), 1)[sentence_doc_arr]
+    position = 1.0 + 0.5 * (1.0 - np.array(sentence_pos))
+    scores = scores / np.maximum(lengths, IDEAL_SENTENCE_LENGTH) * math.sqrt(IDEAL_SENTENCE_LENGTH)
+    scores *= (1.0 + title_hits / title_sizes) * position
+
+    for doc_idx in range(n_docs):
+        row = tfidf[doc_idx]
+        candidates = np.flatnonzero(row)
+        if candidates.size:
+            top = candidates[np.argsort(-row[candidates], kind="stable")[:max_keywords]]
+            results[doc_idx]["keywords"] = vocab[top].tolist()
+
+        doc_sentences = np.flatnonzero(sentence_doc_arr == doc_idx)
+        if doc_sentences.size:
+            best = doc_sentences[np.argsort(-scores[doc_sentences], kind="stable")[:max_sentences]]
+            results[doc_idx]["summary"] = " ".join(sentences[i] for i in np.sort(best))
+
+    return results
+
+
+def apply_keywords_and_summaries(documents: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+    """Fill the "keywords" and "summary" fields of scraped records in place."""
+    try:
+        extracted = extract_keywords_and_summaries(documents, **kwargs)
+    except Exception as e:
+        logger.error(f"Error extracting keywords and summaries: {str(e)}")
+        return documents
+    for doc, fields in zip(documents, extracted):
+        doc["keywords"] = fields["keywords"]
+        doc["summary"] = fields["summary"]
+    return documents